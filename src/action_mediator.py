@@ -1,14 +1,61 @@
+import json
+import re
 from src.config import config
+from src.security_engine import SecurityEngine
+
+# Compiled once at import and shared by every mediator instance. Malicious URLs are matched
+# with SecurityEngine's pattern, so both always apply the same MALICIOUS_URL_PATTERNS.
+_ESCAPE_WORD_RE = re.compile(r"cancel|close|reject|deny|\bx\b", re.IGNORECASE)
+
+# Threat flag bits used to key the high-risk decision table
+_PHISHING = 1 << 0
+_FAKE_DIALOG = 1 << 1
+_SUSPICIOUS_TARGETS = 1 << 2
+
+# Shared by every "allowed" fast-path result; callers only read decisions
+_ALLOWED_DECISION = {
+    "status": "allowed",
+    "reason": "Action adheres to security policies."
+}
 
 class ActionMediator:
     """
     Intercepts and validates actions proposed by the LLM agent.
     Implements security policies and Human-in-the-Loop (HITL) confirmations.
     """
-    
+
     def __init__(self):
-        self.blocked_actions = ["delete", "format", "sys_call"] # Example internal blocklist
-        self.sensitive_actions = ["input_text", "click_submit", "cookie_access"]
+        self.blocked_actions = frozenset({"delete", "format", "sys_call"}) # Example internal blocklist
+        self.sensitive_actions = frozenset({"input_text", "click_submit", "cookie_access"})
+        # Anything outside this set on a low-risk page can only be stopped by the password check
+        self._special_actions = self.blocked_actions | self.sensitive_actions
+
+        # Decision tables for risky pages, built once instead of re-walking the same
+        # if-chain on every call. Action-specific escape rules run first; anything
+        # they don't settle is decided by the page's threat flags.
+        self._escape_rules = {
+            "click": self._escape_click,
+            "navigate": self._escape_navigation,
+        }
+        self._threat_rules = self._build_threat_rules()
+        SecurityEngine._compile_patterns()
+
+    def _build_threat_rules(self) -> dict:
+        """
+        Maps every threat-flag combination to its rule, resolving priority up front:
+        suspicious targets, then phishing, then fake dialogs, then plain confirmation.
+        """
+        rules = {}
+        for flags in range(_SUSPICIOUS_TARGETS << 1):
+            if flags & _SUSPICIOUS_TARGETS:
+                rules[flags] = self._block_suspicious_targets
+            elif flags & _PHISHING:
+                rules[flags] = self._block_phishing
+            elif flags & _FAKE_DIALOG:
+                rules[flags] = self._block_fake_dialog
+            else:
+                rules[flags] = self._confirm_risky_action
+        return rules
 
     def validate_action(self, action_type: str, action_params: dict, risk_report: dict) -> dict:
         """
@@ -19,6 +66,14 @@ class ActionMediator:
         if action_params is None: action_params = {}
         if risk_report is None: risk_report = {"risk_score": 0, "explanation": "Missing report", "threats": {}}
 
+        # Serialized once and shared by the escape-word and password checks below
+        params_lower = json.dumps(action_params, default=str).lower()
+        risk_score = risk_report.get("risk_score", 0)
+
+        # Fast path for the common case: an ordinary action on a low-risk page
+        if risk_score < config.RISK_THRESHOLD and action_type not in self._special_actions and "password" not in params_lower:
+            return _ALLOWED_DECISION
+
         # 1. Block known malicious/sensitive internal actions
         if action_type in self.blocked_actions:
             return {
@@ -27,82 +82,91 @@ class ActionMediator:
             }
 
         # 2. Check if the page risk is too high
-        risk_score = risk_report.get("risk_score", 0)
-        threats = risk_report.get("threats", {})
-
         if risk_score >= config.RISK_THRESHOLD:
-            # SMART REMEDIATION: Allow 'Cancel' or 'Close' buttons even on risky pages
-            target_text = str(action_params).lower()
-            if action_type == "click" and any(word in target_text for word in ["cancel", "close", "reject", "deny", "x"]):
-                return {
-                    "status": "allowed", 
-                    "reason": "Safe action (Cancel/Close) allowed on risky page to enable recovery."
-                }
-
-            # If it's a high risk navigation, we check if we're trying to ESCAPE
-            if action_type == "navigate":
-                dest_url = action_params.get("url", "").lower()
-                current_url = risk_report.get("url", "").lower()
-                
-                # If trying to navigate to the SAME risky page, it's not an escape
-                if dest_url == current_url or dest_url.rstrip('/') == current_url.rstrip('/'):
-                    return {
-                        "status": "blocked",
-                        "reason": f"I've blocked this navigation because you're already on this risky page ({risk_score}/10). Re-loading it won't help—please try a different, safer website instead."
-                    }
-                
-                # BLOCK ESCAPES TO KNOWN MALICIOUS PATTERNS
-                malicious_patterns = ["attacker.com", "leak", "payload", "127.0.0.1/leak"]
-                if any(pattern in dest_url for pattern in malicious_patterns):
-                    return {
-                        "status": "blocked",
-                        "reason": f"I've stopped this navigation because the destination '{dest_url}' is known to be dangerous, and the page you are currently on is also untrusted."
-                    }
-
-                # We almost always allow navigation AWAY from a risky page to provide an escape route.
-                return {
-                    "status": "allowed", 
-                    "reason": f"I'm allowing this navigation because it helps us leave a potentially harmful website ({risk_score}/10)."
-                }
-            
-            # If threats include suspicious targets, we block any click/interact
-            if threats.get("suspicious_targets"):
-                 return {
-                    "status": "blocked",
-                    "reason": "I've disabled this button because it appears to redirect to a malicious or deceptive website."
-                }
-            
-            # CRITICAL: Always block everything on phishing pages
-            if threats.get("phishing"):
-                return {
-                    "status": "blocked",
-                    "reason": f"I've blocked interaction with this page because it appears to be a phishing scam. {risk_report.get('explanation')}"
-                }
-            
-            # CRITICAL: Always block everything if a fake dialog is detected
-            if threats.get("fake_dialog"):
-                return {
-                    "status": "blocked",
-                    "reason": f"I've frozen the page because a fake system dialog was detected. {risk_report.get('explanation')}"
-                }
-
-            # For other actions on a risky page, require approval
-            return {
-                "status": "require_confirmation",
-                "reason": f"Page risk is high ({risk_score}/10). This action might be unsafe."
-            }
+            escape_rule = self._escape_rules.get(action_type)
+            if escape_rule:
+                decision = escape_rule(action_params, params_lower, risk_score, risk_report)
+                if decision:
+                    return decision
+
+            threats = risk_report.get("threats", {})
+            flags = (
+                (_PHISHING if threats.get("phishing") else 0)
+                | (_FAKE_DIALOG if threats.get("fake_dialog") else 0)
+                | (_SUSPICIOUS_TARGETS if threats.get("suspicious_targets") else 0)
+            )
+            return self._threat_rules[flags](risk_score, risk_report)
 
         # 3. Handle sensitive actions (HITL)
-        if action_type in self.sensitive_actions or "password" in str(action_params).lower():
+        if action_type in self.sensitive_actions or "password" in params_lower:
             return {
                 "status": "require_confirmation",
                 "reason": f"High-risk action '{action_type}' requires user approval."
             }
 
         # 4. Success case
+        return _ALLOWED_DECISION
+
+    def _escape_click(self, action_params: dict, params_lower: str, risk_score: int, risk_report: dict) -> dict | None:
+        # SMART REMEDIATION: Allow 'Cancel' or 'Close' buttons even on risky pages
+        if _ESCAPE_WORD_RE.search(params_lower):
+            return {
+                "status": "allowed",
+                "reason": "Safe action (Cancel/Close) allowed on risky page to enable recovery."
+            }
+        return None
+
+    def _escape_navigation(self, action_params: dict, params_lower: str, risk_score: int, risk_report: dict) -> dict:
+        # If it's a high risk navigation, we check if we're trying to ESCAPE
+        dest_url = action_params.get("url", "").lower()
+        current_url = risk_report.get("url", "").lower()
+
+        # If trying to navigate to the SAME risky page, it's not an escape
+        if dest_url.rstrip('/') == current_url.rstrip('/'):
+            return {
+                "status": "blocked",
+                "reason": f"I've blocked this navigation because you're already on this risky page ({risk_score}/10). Re-loading it won't help—please try a different, safer website instead."
+            }
+
+        # BLOCK ESCAPES TO KNOWN MALICIOUS PATTERNS
+        if SecurityEngine._malicious_url_re.search(dest_url):
+            return {
+                "status": "blocked",
+                "reason": f"I've stopped this navigation because the destination '{dest_url}' is known to be dangerous, and the page you are currently on is also untrusted."
+            }
+
+        # We almost always allow navigation AWAY from a risky page to provide an escape route.
         return {
             "status": "allowed",
-            "reason": "Action adheres to security policies."
+            "reason": f"I'm allowing this navigation because it helps us leave a potentially harmful website ({risk_score}/10)."
+        }
+
+    def _block_suspicious_targets(self, risk_score: int, risk_report: dict) -> dict:
+        # If threats include suspicious targets, we block any click/interact
+        return {
+            "status": "blocked",
+            "reason": "I've disabled this button because it appears to redirect to a malicious or deceptive website."
+        }
+
+    def _block_phishing(self, risk_score: int, risk_report: dict) -> dict:
+        # CRITICAL: Always block everything on phishing pages
+        return {
+            "status": "blocked",
+            "reason": f"I've blocked interaction with this page because it appears to be a phishing scam. {risk_report.get('explanation')}"
+        }
+
+    def _block_fake_dialog(self, risk_score: int, risk_report: dict) -> dict:
+        # CRITICAL: Always block everything if a fake dialog is detected
+        return {
+            "status": "blocked",
+            "reason": f"I've frozen the page because a fake system dialog was detected. {risk_report.get('explanation')}"
+        }
+
+    def _confirm_risky_action(self, risk_score: int, risk_report: dict) -> dict:
+        # For other actions on a risky page, require approval
+        return {
+            "status": "require_confirmation",
+            "reason": f"Page risk is high ({risk_score}/10). This action might be unsafe."
         }
 
     def explain_decision(self, decision: dict) -> str:
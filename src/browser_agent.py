@@ -1,4 +1,7 @@
 import asyncio
+from collections import deque
+from contextlib import AsyncExitStack
+import httpx
 from playwright.async_api import async_playwright
 from openai import AsyncOpenAI
 from src.config import config
@@ -6,56 +9,133 @@ from src.security_engine import SecurityEngine
 from src.action_mediator import ActionMediator
 import json
 
+# Characters of sanitized page text sent to the LLM each turn
+_PAGE_CONTEXT_CHARS = 2000
+
+# Interaction highlight. The source never changes, so the browser can reuse its compiled
+# function; the per-call style values travel as the evaluate argument instead.
+_HIGHLIGHT_JS = """(el, [border, durationMs]) => {
+    el.style.border = border;
+    setTimeout(() => { el.style.border = ''; }, durationMs);
+    return el.innerText;
+}"""
+_HIGHLIGHT_ARG = ["5px solid #fa3e3e", 500]
+
+# Passed on every completion request; hoisted so it isn't rebuilt each turn
+_RESPONSE_FORMAT = {"type": "json_object"}
+
+# Static head of audit_log.html, encoded once at import
+_AUDIT_HEADER_HTML = """
+<html>
+<head>
+    <title>SecureAgent Audit Log</title>
+    <style>
+        body { font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; margin: 40px; background: #f0f2f5; color: #1c1e21; }
+        .container { max-width: 900px; margin: auto; }
+        .step { background: white; border-radius: 12px; padding: 20px; margin-bottom: 24px; box-shadow: 0 4px 12px rgba(0,0,0,0.08); transition: transform 0.2s; }
+        .step:hover { transform: translateY(-2px); }
+        .blocked { border-left: 8px solid #fa3e3e; }
+        .allowed { border-left: 8px solid #42b72a; }
+        .confirmation { border-left: 8px solid #f1c40f; }
+        .action-header { font-weight: bold; font-size: 1.25em; border-bottom: 1px solid #ddd; padding-bottom: 10px; margin-bottom: 15px; display: flex; justify-content: space-between; }
+        .metadata { background: #f8f9fa; padding: 12px; border-radius: 8px; font-size: 0.95em; line-height: 1.6; }
+        .threat-alert { background: #fff2f2; border: 1px solid #ffebeb; padding: 15px; border-radius: 8px; margin-top: 15px; }
+        .threat-title { color: #fa3e3e; font-weight: bold; margin-bottom: 5px; display: flex; align-items: center; }
+        .badge { padding: 4px 10px; border-radius: 20px; font-size: 0.8em; text-transform: uppercase; color: white; }
+        .badge-blocked { background: #fa3e3e; }
+        .badge-allowed { background: #42b72a; }
+        .badge-confirmation { background: #f1c40f; color: #333; }
+        .badge-escape { background: #1877f2; }
+        .screenshot-container { margin-top: 15px; border-radius: 8px; overflow: hidden; border: 1px solid #ddd; }
+        .screenshot-container img { width: 100%; display: block; cursor: zoom-in; }
+        .session-header { background: #34495e; color: white; padding: 15px; border-radius: 8px; margin: 40px 0 20px 0; font-size: 1.1em; display: flex; align-items: center; }
+        .session-header small { margin-left: auto; opacity: 0.8; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>🛡️ SecureAgent Audit Log</h1>
+        <p>Real-time security monitoring and interaction history.</p>
+""".encode("utf-8")
+
 class BrowserAgent:
     def __init__(self):
+        # Keep-alive pool shared by every LLM turn so connections are set up once per agent
+        http_client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(
+                retries=1,
+                limits=httpx.Limits(max_keepalive_connections=8, keepalive_expiry=60),
+            )
+        )
         if config.USE_OLLAMA:
             self.client = AsyncOpenAI(
                 base_url=config.OLLAMA_BASE_URL,
                 api_key="ollama", # Ollama doesn't require a real key
+                http_client=http_client,
             )
             self.model = config.OLLAMA_MODEL
         else:
-            self.client = AsyncOpenAI(api_key=config.OPENAI_API_KEY)
+            self.client = AsyncOpenAI(api_key=config.OPENAI_API_KEY, http_client=http_client)
             self.model = "gpt-4o"
             
         self.security_engine = SecurityEngine()
         self.action_mediator = ActionMediator()
+        self.playwright = None
         self.browser = None
         self.context = None
         self.page = None
+        # Owns the Playwright/browser/context lifecycle; closed in reverse order of creation
+        self._browser_stack: AsyncExitStack | None = None
         self.audit_log_path = "audit_log.html"
-        self._last_logged_action: str | None = None
+        # Occurrences of each blocked action this session, for repeat suppression
+        self._block_counts: dict[str, int] = {}
+        # Audit entries are queued here and appended to disk in batches by _log_writer
+        self._log_queue: asyncio.Queue[str] = asyncio.Queue()
+        self._log_writer_task: asyncio.Task | None = None
+        # Evidence screenshots are captured off the agent loop by _screenshot_worker
+        self._screenshot_queue: asyncio.Queue[tuple] = asyncio.Queue(maxsize=32)
+        self._screenshot_workers: list[asyncio.Task] = []
+        self._dropped_screenshots = 0
+        # (hash(html), url) -> (clean_content, risk_report); the DOM is often unchanged between turns
+        self._state_cache: dict[tuple[int, str], tuple[str, dict]] = {}
 
     async def start(self):
         """Initializes the browser and security engine."""
-        self.playwright = await async_playwright().start()
-        self.browser = await self.playwright.chromium.launch(headless=config.BROWSER_HEADLESS)
-        self.context = await self.browser.new_context()
-        self.page = await self.context.new_page()
+        # A restart after a crash tears the previous browser down first
+        await self._close_browser()
+        async with AsyncExitStack() as stack:
+            self.playwright = await stack.enter_async_context(async_playwright())
+            self.browser = await self.playwright.chromium.launch(headless=config.BROWSER_HEADLESS)
+            stack.push_async_callback(self.browser.close)
+            self.context = await self.browser.new_context()
+            stack.push_async_callback(self.context.close)
+            self.page = await self.context.new_page()
+            # Launched cleanly: keep everything open until _close_browser
+            self._browser_stack = stack.pop_all()
         self._init_audit()
+        if self._log_writer_task is None or self._log_writer_task.done():
+            self._log_writer_task = asyncio.create_task(self._log_writer())
+        if not self._screenshot_workers:
+            self._screenshot_workers = [asyncio.create_task(self._screenshot_worker()) for _ in range(2)]
         print(f"[*] Browser started (Headless: {config.BROWSER_HEADLESS})")
 
     async def stop(self):
+        await self._flush_screenshots()
+        await self._flush_audit()
+        await self._close_browser()
+        try: await self.client.close()
+        except Exception: pass
+
+    async def _close_browser(self):
+        """Closes the context (and its pages), browser and Playwright. Safe to call more than once."""
+        stack, self._browser_stack = self._browser_stack, None
+        if stack is None:
+            return
         try:
-            # Check if event loop is still running before closing
-            loop = asyncio.get_event_loop()
-            if not loop.is_running():
-                return
-
-            if self.page:
-                try: await self.page.close()
-                except: pass
-            if self.context:
-                try: await self.context.close()
-                except: pass
-            if self.browser:
-                try: await self.browser.close()
-                except: pass
-            if hasattr(self, 'playwright') and self.playwright:
-                try: await self.playwright.stop()
-                except: pass
-        except Exception:
-            pass
+            await stack.aclose()
+        except Exception as e:
+            print(f"[!] Warning: Error while closing browser: {e}")
+        self.page = self.context = self.browser = self.playwright = None
 
 
     async def execute_task(self, task: str):
@@ -85,7 +165,13 @@ class BrowserAgent:
         {{ "action": "finish", "answer": "..." }}
         """
         
-        messages = [{"role": "system", "content": system_prompt}]
+        # The request is always [system prompt, *history, page context]. Only the
+        # latest page context is ever sent, so it lives in its own slot and is
+        # overwritten each turn instead of being filtered out of the history.
+        # The history is a sliding window so request size stays bounded on long tasks.
+        system_msg = {"role": "system", "content": system_prompt}
+        history: deque[dict] = deque(maxlen=config.MAX_HISTORY_MESSAGES)
+        page_ctx_msg = {"role": "user", "content": "The browser is currently on about:blank. Please navigate to a URL to start."}
         
         # Loop prevention and state tracking
         consecutive_blocks = 0
@@ -107,24 +193,20 @@ class BrowserAgent:
 
                 if self.page.url != "about:blank":
                     html = await self.page.content()
-                    clean_content = self.security_engine.sanitize_for_llm(html)
-                    risk_report = self.security_engine.analyze_page(html, self.page.url)
-                    
+                    clean_content, risk_report = await self._page_state(html, self.page.url)
+
                     # We only keep the LATEST page content to avoid token bloat and confusion
-                    messages = [m for m in messages if not (m["role"] == "user" and "Page Content:" in m["content"])]
-                    
-                    messages.append({
+                    page_ctx_msg = {
                         "role": "user", 
-                        "content": f"Current URL: {self.page.url}\nPage Content:\n{clean_content[:2000]}\n\nSecurity Risk Score: {risk_report['risk_score']}\nThreats: {json.dumps(risk_report['threats'])}"
-                    })
+                        "content": f"Current URL: {self.page.url}\nPage Content:\n{clean_content}\n\nSecurity Risk Score: {risk_report['risk_score']}\nThreats: {json.dumps(risk_report['threats'])}"
+                    }
                 else:
-                    messages = [m for m in messages if not (m["role"] == "user" and "about:blank" in m["content"])]
-                    messages.append({"role": "user", "content": "The browser is currently on about:blank. Please navigate to a URL to start."})
+                    page_ctx_msg = {"role": "user", "content": "The browser is currently on about:blank. Please navigate to a URL to start."}
             except Exception as e:
                 print(f"[!] Browser communication error: {str(e)}")
                 # Reset risk report to safe default on error
                 risk_report = {"risk_score": 0, "explanation": f"State analysis failed: {str(e)}", "threats": {}}
-                messages.append({"role": "system", "content": f"ERROR: Browser state lost: {str(e)}. Please restart navigation."})
+                history.append({"role": "system", "content": f"ERROR: Browser state lost: {str(e)}. Please restart navigation."})
                 # Re-create page if it's fully gone
                 if "closed" in str(e).lower():
                     self.page = await self.context.new_page()
@@ -135,15 +217,15 @@ class BrowserAgent:
             try:
                 response = await self.client.chat.completions.create(
                     model=self.model,
-                    messages=messages,
-                    response_format={ "type": "json_object" }
+                    messages=[system_msg, *history, page_ctx_msg],
+                    response_format=_RESPONSE_FORMAT
                 )
             except Exception as e:
                 print(f"[!] LLM Error: {e}")
                 break
             
             assistant_msg = response.choices[0].message.content
-            messages.append({"role": "assistant", "content": assistant_msg})
+            history.append({"role": "assistant", "content": assistant_msg})
             
             try:
                 action_data = json.loads(assistant_msg)
@@ -151,11 +233,13 @@ class BrowserAgent:
                     raise ValueError("Model returned empty or non-dictionary action.")
             except (json.JSONDecodeError, ValueError) as e:
                 print(f"[!] Error: Model returned invalid JSON or action: {assistant_msg}")
-                messages.append({"role": "system", "content": f"ERROR: Invalid JSON response. Please respond with a valid JSON action dict."})
+                history.append({"role": "system", "content": f"ERROR: Invalid JSON response. Please respond with a valid JSON action dict."})
                 continue
 
             action_type = action_data.get("action", "unknown")
-            print(f"[AGENT] Proposed Action: {action_type} | Params: {json.dumps(action_data)}")
+            # Serialized once per turn and reused for terminal output and the audit log
+            action_json = json.dumps(action_data)
+            print(f"[AGENT] Proposed Action: {action_type} | Params: {action_json}")
             
             if action_type == "finish":
                 print(f"[+] Task finished: {action_data.get('answer', 'No answer provided.')}")
@@ -177,7 +261,7 @@ class BrowserAgent:
             log_messages = [
                 "\n" + "=" * 60,
                 f"🏃 ACTION: {action_type.upper()}",
-                f"🎯 TARGET: {json.dumps(action_data)}",
+                f"🎯 TARGET: {action_json}",
                 f"🌐 PAGE: {self.page.url}",
                 f"🛡️ SECURITY: {risk_report.get('risk_score', 0)}/10 - {risk_report.get('explanation', 'Safe.')}",
                 f"⚖️ DECISION: {decision['status'].upper()} - {decision['reason']}",
@@ -194,19 +278,22 @@ class BrowserAgent:
                      print("[!] CRITICAL LOOP DETECTED. Stopping agent to prevent infinite retry.")
                      break
                 
-                messages.append({
+                history.append({
                     "role": "system", 
                     "content": f"SECURITY BLOCK: I had to stop your '{action_type}' action. \nREASON: {decision['reason']} \n\nHOW TO RECOVER:\n1. If this is a phishing or fake dialog page, DO NOT keep trying to interact with it.\n2. Do NOT reload or navigate back to the same URL; I will just block it again.\n3. Search for a 'Cancel' or 'Close' button to safely exit the threat.\n4. If no safe buttons exist, navigate to a new, trusted URL to continue your task."
                 })
-                await self._log_to_audit(action_type, action_data, risk_report, decision)
+                await self._log_to_audit(action_type, action_json, risk_report, decision)
                 continue
             
             print("\n".join(log_messages))
             
             # Update Audit Log
-            await self._log_to_audit(action_type, action_data, risk_report, decision)
+            await self._log_to_audit(action_type, action_json, risk_report, decision)
+            # The evidence must show the page this entry describes, so let queued captures
+            # finish before the confirmation prompt blocks the loop or the action changes the page
+            await self._screenshot_queue.join()
             
-            current_action_str = json.dumps(action_data)
+            current_action_str = action_json
             
             # Reset counter if action is allowed
             consecutive_blocks = 0
@@ -216,48 +303,37 @@ class BrowserAgent:
                 print(f"[HITL] User confirmation needed for: {action_type}")
                 user_input = input("Allow this action? (y/n): ")
                 if user_input.lower() != 'y':
-                    messages.append({"role": "system", "content": "Action rejected by user."})
+                    history.append({"role": "system", "content": "Action rejected by user."})
                     continue
 
             # 4. Perform Action
             try:
-                # Interaction Highlighting
-                async def _highlight(selector):
-                    if not selector: return
-                    try:
-                        # Use JSON dumps for safe selector passing to JS
-                        safe_sel = json.dumps(selector)
-                        await self.page.evaluate(f"document.querySelector({safe_sel}).style.border = '5px solid #fa3e3e'")
-                        await asyncio.sleep(0.5)
-                        await self.page.evaluate(f"document.querySelector({safe_sel}).style.border = ''")
-                    except: pass
-
                 # VALIDATION: Prevent navigation to invalid URLs
                 if action_type == "navigate":
                     target_url = action_data.get("url", "").strip()
                     if not target_url or target_url in ["#", "about:blank"]:
-                        messages.append({"role": "system", "content": f"Navigation to '{target_url}' is invalid. Please provide a full URL."})
+                        history.append({"role": "system", "content": f"Navigation to '{target_url}' is invalid. Please provide a full URL."})
                         continue
                     await self.page.goto(target_url, wait_until="load", timeout=15000)
                 
                 elif action_type == "click":
                     selector = action_data.get("selector")
-                    await _highlight(selector)
+                    el_text = await self._highlight(selector)
                     
                     # Detect Safe Escape (Agent choosing to Cancel/Close a threat)
-                    el_text = await self.page.inner_text(selector) if self.page else ""
                     is_remediation = any(k in el_text.lower() for k in ["cancel", "close", "exit", "back", "stop", "ignore"])
                     
                     if risk_report.get("risk_score", 0) >= 5 and is_remediation:
                         print(f"✅ SAFE ESCAPE: Agent clicked '{el_text}' to remediate threat.")
-                        await self._log_to_audit("click", action_data, risk_report, {"status": "escape", "reason": "Agent initiated remediation click."})
+                        await self._log_to_audit("click", action_json, risk_report, {"status": "escape", "reason": "Agent initiated remediation click."})
+                        await self._screenshot_queue.join()
                     
                     await self.page.click(selector, timeout=10000)
                 
                 elif action_type == "type":
                     selector = action_data.get("selector")
                     text = action_data.get("text")
-                    await _highlight(selector)
+                    await self._highlight(selector)
                     await self.page.fill(selector, text, timeout=10000)
                 elif action_type == "wait":
                     wait_time = action_data.get("seconds", 2)
@@ -267,7 +343,7 @@ class BrowserAgent:
                 print(f"[!] ACTION ERROR: {error_msg}")
                 
                 # Report error back to LLM to allow it to recover
-                messages.append({
+                history.append({
                     "role": "system", 
                     "content": f"ERROR: The '{action_type}' action failed. Detail: {error_msg}. Please check if the selector is correct or try a different approach."
                 })
@@ -279,48 +355,49 @@ class BrowserAgent:
                 
                 continue
 
+    async def _page_state(self, html: str, url: str) -> tuple[str, dict]:
+        """Returns the sanitized text and risk report for a page, reusing earlier results for identical HTML."""
+        key = (hash(html), url)
+        state = self._state_cache.get(key)
+        if state is None:
+            # Both are CPU-bound parses; run them side by side off the event loop so
+            # the audit writer and screenshot workers keep making progress.
+            state = tuple(await asyncio.gather(
+                asyncio.to_thread(self.security_engine.sanitize_for_llm, html, _PAGE_CONTEXT_CHARS),
+                asyncio.to_thread(self.security_engine.analyze_page, html, url),
+            ))
+            if len(self._state_cache) >= 16:
+                del self._state_cache[next(iter(self._state_cache))]
+            self._state_cache[key] = state
+
+        clean_content, risk_report = state
+        # The loop adjusts the report in place (intent mismatch), so never hand out the cached dict
+        return clean_content, dict(risk_report)
+
+    async def _highlight(self, selector: str) -> str:
+        """
+        Flashes a red border around the target element before interacting with it.
+        Returns the element's visible text ("" if it couldn't be resolved).
+        """
+        if not selector: return ""
+        try:
+            # One round-trip: the page clears the border itself instead of us sleeping
+            # and issuing a second evaluate, and hands back the text in the same call.
+            return await self.page.locator(selector).first.evaluate(_HIGHLIGHT_JS, _HIGHLIGHT_ARG, timeout=2000) or ""
+        except Exception:
+            return ""
+
     def _init_audit(self):
         """Initializes the HTML audit log file."""
         self.audit_log_path = "audit_log.html"
-        header_html = """
-<html>
-<head>
-    <title>SecureAgent Audit Log</title>
-    <style>
-        body { font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; margin: 40px; background: #f0f2f5; color: #1c1e21; }
-        .container { max-width: 900px; margin: auto; }
-        .step { background: white; border-radius: 12px; padding: 20px; margin-bottom: 24px; box-shadow: 0 4px 12px rgba(0,0,0,0.08); transition: transform 0.2s; }
-        .step:hover { transform: translateY(-2px); }
-        .blocked { border-left: 8px solid #fa3e3e; }
-        .allowed { border-left: 8px solid #42b72a; }
-        .confirmation { border-left: 8px solid #f1c40f; }
-        .action-header { font-weight: bold; font-size: 1.25em; border-bottom: 1px solid #ddd; padding-bottom: 10px; margin-bottom: 15px; display: flex; justify-content: space-between; }
-        .metadata { background: #f8f9fa; padding: 12px; border-radius: 8px; font-size: 0.95em; line-height: 1.6; }
-        .threat-alert { background: #fff2f2; border: 1px solid #ffebeb; padding: 15px; border-radius: 8px; margin-top: 15px; }
-        .threat-title { color: #fa3e3e; font-weight: bold; margin-bottom: 5px; display: flex; align-items: center; }
-        .badge { padding: 4px 10px; border-radius: 20px; font-size: 0.8em; text-transform: uppercase; color: white; }
-        .badge-blocked { background: #fa3e3e; }
-        .badge-allowed { background: #42b72a; }
-        .badge-confirmation { background: #f1c40f; color: #333; }
-        .badge-escape { background: #1877f2; }
-        .screenshot-container { margin-top: 15px; border-radius: 8px; overflow: hidden; border: 1px solid #ddd; }
-        .screenshot-container img { width: 100%; display: block; cursor: zoom-in; }
-        .session-header { background: #34495e; color: white; padding: 15px; border-radius: 8px; margin: 40px 0 20px 0; font-size: 1.1em; display: flex; align-items: center; }
-        .session-header small { margin-left: auto; opacity: 0.8; }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <h1>🛡️ SecureAgent Audit Log</h1>
-        <p>Real-time security monitoring and interaction history.</p>
-"""
-        with open(self.audit_log_path, "w", encoding="utf-8") as f:
-            f.write(header_html)
+        with open(self.audit_log_path, "wb") as f:
+            f.write(_AUDIT_HEADER_HTML)
 
     def _log_session_start(self, task_name: str):
         """Inserts a task header into the audit log."""
         from datetime import datetime
         time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._block_counts.clear()
         
         session_html = f"""
         <div class="session-header">
@@ -328,8 +405,70 @@ class BrowserAgent:
             <span class="session-time">{time_str}</span>
         </div>
         """
-        with open(self.audit_log_path, "a", encoding="utf-8") as f:
-            f.write(session_html)
+        self._log_queue.put_nowait(session_html)
+
+    async def _log_writer(self):
+        """Drains queued audit entries and appends them to the log file in batches."""
+        while True:
+            batch = [await self._log_queue.get()]
+            while not self._log_queue.empty() and len(batch) < 100:
+                batch.append(self._log_queue.get_nowait())
+            try:
+                await asyncio.to_thread(self._append_audit, "".join(batch))
+            except Exception as e:
+                # Keep the writer alive: one bad batch must not silently drop every later entry
+                print(f"[!] Warning: Failed to write audit log: {e}")
+            finally:
+                for _ in batch:
+                    self._log_queue.task_done()
+
+    def _append_audit(self, html: str):
+        # Task text and page URLs can carry lone surrogates; escape them rather than fail the batch
+        with open(self.audit_log_path, "a", encoding="utf-8", errors="backslashreplace") as f:
+            f.write(html)
+
+    async def _flush_audit(self):
+        """Waits until every queued audit entry is on disk, then stops the writer."""
+        if self._log_writer_task and not self._log_writer_task.done():
+            await self._log_queue.join()
+            self._log_writer_task.cancel()
+        self._log_writer_task = None
+
+    def _queue_screenshot(self, path: str):
+        """
+        Schedules an evidence screenshot of the current page without waiting for it.
+        Callers about to change the page await self._screenshot_queue.join() first.
+        """
+        try:
+            self._screenshot_queue.put_nowait((self.page, path))
+        except asyncio.QueueFull:
+            # Drop the oldest pending capture so the most recent evidence is kept
+            self._screenshot_queue.get_nowait()
+            self._screenshot_queue.task_done()
+            self._dropped_screenshots += 1
+            self._screenshot_queue.put_nowait((self.page, path))
+
+    async def _screenshot_worker(self):
+        """Captures queued screenshots one at a time."""
+        while True:
+            page, path = await self._screenshot_queue.get()
+            try:
+                if not page.is_closed():
+                    await page.screenshot(path=path)
+            except Exception as e:
+                print(f"[!] Warning: Failed to capture screenshot: {e}")
+            finally:
+                self._screenshot_queue.task_done()
+
+    async def _flush_screenshots(self):
+        """Waits for pending screenshots while the pages are still open, then stops the workers."""
+        if self._screenshot_workers:
+            await self._screenshot_queue.join()
+            for worker in self._screenshot_workers:
+                worker.cancel()
+        self._screenshot_workers = []
+        if self._dropped_screenshots:
+            print(f"[!] Warning: {self._dropped_screenshots} evidence screenshot(s) dropped under load.")
 
     def explain_decision(self, decision: dict) -> str:
         """
@@ -345,19 +484,22 @@ class BrowserAgent:
         else:
             return f"❓ [SECURITY ACTION]: I'm not sure about this one. {reason}"
 
-    async def _log_to_audit(self, action_type, action_params, risk_report, decision):
+    async def _log_to_audit(self, action_type, action_params_json, risk_report, decision):
         """Appends a new interaction to the HTML audit log with visual evidence."""
         import os
         import time
         from datetime import datetime
 
         status = decision["status"]
-        action_key = f"{status}:{action_type}:{json.dumps(action_params)}"
+        action_key = f"{status}:{action_type}:{action_params_json}"
         
-        if status == "blocked" and action_key == self._last_logged_action:
-            return # Skip repeat blocks
-            
-        self._last_logged_action = action_key
+        repeat_count = 1
+        if status == "blocked":
+            # Under retry storms only the 1st, 2nd, 4th, 8th... repeat of a block is written
+            repeat_count = self._block_counts[action_key] = self._block_counts.get(action_key, 0) + 1
+            if repeat_count & (repeat_count - 1):
+                return # Skip repeat blocks
+        repeat_html = f" ×{repeat_count}" if repeat_count > 1 else ""
         timestamp = datetime.now().strftime("%H:%M:%S")
         
         # Capture Screenshot for high-risk or blocked actions
@@ -365,10 +507,11 @@ class BrowserAgent:
         if (status in ["blocked", "require_confirmation"] or risk_report.get("risk_score", 0) >= 5) and self.page:
             try:
                 if not os.path.exists("screenshots"): os.makedirs("screenshots")
-                filename = f"screenshots/evidence_{int(time.time())}.png"
-                await self.page.screenshot(path=filename)
+                # Nanoseconds: several captures can be queued within the same second
+                filename = f"screenshots/evidence_{time.time_ns()}.png"
+                self._queue_screenshot(filename)
                 screenshot_html = f'<div class="screenshot-container"><img src="{filename}" alt="Security Evidence"></div>'
-            except Exception as e:
+            except OSError as e:
                 print(f"[!] Warning: Failed to capture screenshot: {e}")
 
         badge_class = f"badge-{status}"
@@ -386,12 +529,12 @@ class BrowserAgent:
         entry_html = f"""
         <div class="{step_class}">
             <div class="action-header">
-                <span><span class="badge {badge_class}">{status}</span> {action_type.upper()}</span>
+                <span><span class="badge {badge_class}">{status}</span> {action_type.upper()}{repeat_html}</span>
                 <span style="color: #65676b; font-size: 0.8em;">{timestamp}</span>
             </div>
             <div class="metadata">
                 <strong>Current URL:</strong> {current_url}<br>
-                <strong>Params:</strong> {json.dumps(action_params)}<br>
+                <strong>Params:</strong> {action_params_json}<br>
                 <strong>Risk Score:</strong> {risk_report.get('risk_score', 0)}/10<br>
                 <strong>Security Analysis:</strong> {risk_report.get('explanation', 'N/A')}
             </div>
@@ -399,5 +542,4 @@ class BrowserAgent:
             {screenshot_html}
         </div>
         """
-        with open(self.audit_log_path, "a", encoding="utf-8") as f:
-            f.write(entry_html)
+        await self._log_queue.put(entry_html)
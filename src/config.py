@@ -10,26 +10,38 @@ class Config:
     USE_OLLAMA = os.getenv("USE_OLLAMA", "true").lower() == "true"
     
     BROWSER_HEADLESS = os.getenv("BROWSER_HEADLESS", "false").lower() == "true"
+    # Tree builder BeautifulSoup uses for page analysis: "lxml" or the built-in "html.parser",
+    # the two the engine's raw-markup shortcuts are checked against
+    HTML_PARSER = os.getenv("HTML_PARSER", "lxml")
     
+    # Agent Settings
+    MAX_HISTORY_MESSAGES = 20 # assistant replies + system notes kept in the LLM context
+    
+    # Keyword collections are tuples: immutable, but ordered, since detectors
+    # report the first match and scan them as substrings rather than by equality.
+
     # Trust Settings
-    TRUSTED_DOMAINS = ["bbc.com", "google.com", "microsoft.com", "apple.com", "github.com", "wikipedia.org"]
+    TRUSTED_DOMAINS = ("bbc.com", "google.com", "microsoft.com", "apple.com", "github.com", "wikipedia.org")
     
     # Phishing & Brand Detection
-    BRAND_KEYWORDS = ["google", "facebook", "bank", "amazon", "microsoft", "apple", "signin", "login", "password", "credential"]
+    BRAND_KEYWORDS = ("google", "facebook", "bank", "amazon", "microsoft", "apple", "signin", "login", "password", "credential")
     
     # Fake Dialog Keywords
-    DIALOG_KEYWORDS = ["security alert", "update now", "out of date", "vulnerable", "critical", "scanner", "detected"]
+    DIALOG_KEYWORDS = ("security alert", "update now", "out of date", "vulnerable", "critical", "scanner", "detected")
+    
+    # Known malicious destinations (substring match against URLs)
+    MALICIOUS_URL_PATTERNS = ("attacker.com", "leak", "payload")
     
     # Security Thresholds
     RISK_THRESHOLD = 4 # 0-10, actions blocked above this
     
     # Prompt Injection Keywords
-    INJECTION_KEYWORDS = [
+    INJECTION_KEYWORDS = (
         "ignore previous instructions",
         "ignore all previous instructions",
         "system prompt",
         "new instructions",
         "do not follow"
-    ]
+    )
 
 config = Config()
@@ -18,10 +18,9 @@ async def main():
         print("Type 'exit' to quit.")
         
         while True:
-            # Use run_in_executor to avoid blocking the event loop while waiting for input
+            # Read input on a worker thread to avoid blocking the event loop
             try:
-                loop = asyncio.get_event_loop()
-                task = await loop.run_in_executor(None, lambda: input("\nEnter your task (e.g., 'Find the latest news on BBC'): "))
+                task = await asyncio.to_thread(input, "\nEnter your task (e.g., 'Find the latest news on BBC'): ")
                 
                 if not task or task.lower() == 'exit':
                     break
@@ -1,45 +1,206 @@
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, CData, NavigableString, Tag
+from collections import OrderedDict
 import re
+import threading
+from urllib.parse import urlparse
 from src.config import config
 
+# Risk weight per detected signal as (untrusted domain, trusted domain). Split into one
+# lookup table per trust level up front so scoring is plain indexing and addition.
+_RISK_WEIGHTS = {
+    "injection": (5, 2),
+    "hidden": (3, 1),
+    "deceptive": (4, 2),
+    "homograph": (8, 8),
+    "phishing": (7, 7),
+    "fake_dialog": (5, 5),
+    "suspicious_targets": (4, 4),
+}
+_WEIGHTS_BY_TRUST = tuple({name: pair[trusted] for name, pair in _RISK_WEIGHTS.items()} for trusted in (0, 1))
+_MAX_RISK_SCORE = 10
+
+# Common character substitutions in lookalike domains as (lookalike, original)
+_LOOKALIKE_SUBSTITUTIONS = (('0', 'o'), ('1', 'l'), ('rn', 'm'), ('vv', 'w'))
+
+# Number of risk reports kept by analyze_page's LRU cache
+_REPORT_CACHE_SIZE = 256
+
+# Inline styles that hide an element (and everything inside it) from a human reader
+_HIDDEN_STYLES = ('display:none', 'visibility:hidden', 'font-size:0')
+# Link targets _analyze_button_targets treats as the attacker (simulated locally)
+_ATTACKER_TARGET_MARKERS = ("127.0.0.1", "attacker.com")
+# Character references that can spell a trigger's '#', ':' or '.' the raw markup doesn't show
+_CHARREF_HINTS = ('&#', '&colon;', '&period;')
+# Characters re.IGNORECASE folds onto ASCII letters but str.lower() leaves non-ASCII
+_CASEFOLD_EXTRAS = ('\u0130', '\u0131', '\u017f')
+# Tree builders _has_triggers was checked against; others may drop more of the markup
+# (html5lib, for one, removes NUL characters from text), so every page gets parsed
+_PREFILTER_PARSERS = ("lxml", "html.parser")
+# String types get_text() treats as readable content (comments, doctype etc. are not)
+_CONTENT_STRING_TYPES = (NavigableString, CData)
+
+def _substring_re(needles, flags: int = 0) -> re.Pattern:
+    """
+    One pattern finding any of needles as a plain substring. With no needles it never
+    matches, like any() over an empty list (an empty alternation would match everything).
+    """
+    if not needles: return re.compile(r"(?!)")
+    return re.compile("|".join(map(re.escape, needles)), flags)
+
+def _trie_pattern(strings) -> str:
+    """
+    Pattern source matching any of strings, factored into a trie so each branch point has
+    one alternative per distinct next character and re never re-reads a shared prefix.
+    """
+    trie = {}
+    for string in strings:
+        node = trie
+        for char in string: node = node.setdefault(char, {})
+        node[""] = {}  # a string ends here
+
+    def emit(node: dict) -> str:
+        branches = [re.escape(char) + emit(child) for char, child in node.items() if char]
+        if not branches: return ""
+        source = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{source})?" if "" in node else source
+
+    return emit(trie)
+
+def _style_hints(html_content: str) -> tuple[bool, bool, bool]:
+    """
+    Cheap checks on the raw markup, as (may_hide, may_overlay, may_fade), telling which
+    style-based detectors can possibly fire. A lowercased inline style only contains a
+    marker if the lowercased markup does, unless it is spelled with character references,
+    so markup with those always gets the full checks.
+    """
+    html_lower = html_content.lower()
+    if '&#' in html_lower or '&colon;' in html_lower:
+        return True, True, True
+    return (
+        any(marker in html_lower for marker in _HIDDEN_STYLES),
+        'z-index' in html_lower,
+        'opacity' in html_lower,
+    )
+
+def _levenshtein(s1: str, s2: str, max_distance: int) -> int:
+    """
+    Edit distance between s1 and s2, bailing out once it is known to exceed max_distance
+    (row minima never decrease), in which case max_distance + 1 is returned.
+    """
+    if len(s1) < len(s2): s1, s2 = s2, s1
+    if not s2: return min(len(s1), max_distance + 1)
+    previous_row = range(len(s2) + 1)
+    for i, c1 in enumerate(s1):
+        current_row = [i + 1]
+        for j, c2 in enumerate(s2):
+            insertions = previous_row[j + 1] + 1
+            deletions = current_row[j] + 1
+            substitutions = previous_row[j] + (c1 != c2)
+            current_row.append(min(insertions, deletions, substitutions))
+        if min(current_row) > max_distance:
+            return max_distance + 1
+        previous_row = current_row
+    return min(previous_row[-1], max_distance + 1)
+
 class SecurityEngine:
     """
     Handles detection of malicious content, hidden text, and risk scoring.
     """
+
+    # Set once the class-level keyword snapshots and patterns exist; see _compile_patterns
+    _compiled = False
     
     def __init__(self):
-        self.injection_pattern = re.compile("|".join(config.INJECTION_KEYWORDS), re.IGNORECASE)
+        self._compile_patterns()
+        # (hash(html), url) -> risk report, least recently used first. Locked because
+        # the agent runs analyze_page in worker threads.
+        self._report_cache: OrderedDict[tuple[int, str], dict] = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    @classmethod
+    def _compile_patterns(cls, force: bool = False):
+        """
+        Snapshots the keyword lists from config and compiles the patterns built from them,
+        once for every engine rather than per instance. The snapshots keep patterns, detectors
+        and cached reports in agreement; after changing config at runtime, call this with
+        force=True and cache_clear() any engine whose cached reports predate the change.
+        ActionMediator matches malicious URLs with _malicious_url_re too.
+        """
+        if cls._compiled and not force: return
+        cls._brand_keywords = tuple(config.BRAND_KEYWORDS)
+        cls._dialog_keywords = tuple(config.DIALOG_KEYWORDS)
+        cls._injection_keywords = tuple(config.INJECTION_KEYWORDS)
+        cls._malicious_url_re = _substring_re(config.MALICIOUS_URL_PATTERNS, re.IGNORECASE)
+        # Case-sensitive, like the `domain in url` checks it replaces
+        cls._trusted_domain_re = _substring_re(config.TRUSTED_DOMAINS)
+        # (trusted domain, its first label) pairs the homograph check compares against, split once
+        cls._trusted_labels = tuple((trusted, trusted.split('.')[0]) for trusted in config.TRUSTED_DOMAINS)
+        # One capture group per keyword, so a match maps back to its keyword by group number
+        cls.injection_pattern = re.compile("|".join(f"({re.escape(kw)})" for kw in cls._injection_keywords), re.IGNORECASE)
+        cls.opacity_re = re.compile(r'opacity:\s*([0-9.]+)')
+        cls.onclick_re = re.compile(r"window\.location\s*=\s*['\"]([^'\"]+)['\"]")
+        # Everything in the raw markup a page-content detector could fire on (see
+        # _has_triggers). Injection keywords are matched across whitespace and tag boundaries
+        # in the parsed text, so only their longest word has to appear verbatim.
+        text_triggers = tuple(dict.fromkeys((
+            *cls._brand_keywords,
+            *(max(kw.split(), key=len) for kw in cls._injection_keywords),
+        )))
+        # Lowercase, to be found in the lowercased markup with plain substring scans
+        cls._triggers = tuple(trigger.lower() for trigger in (
+            *_HIDDEN_STYLES, 'z-index', 'opacity', *text_triggers, *_ATTACKER_TARGET_MARKERS, *_CHARREF_HINTS))
+        # Markup the tree builder drops (a stray </div>, say) glues the text around it back
+        # together, so a text trigger can also arrive split: a prefix of it right before a '<'
+        # and the rest right after a '>'. Prefixes are matched on the reversed markup so both
+        # patterns start with a literal that re can scan ahead for.
+        cls._split_head_re = re.compile("<" + _trie_pattern(
+            word[:i][::-1] for word in text_triggers for i in range(1, len(word))), re.IGNORECASE)
+        cls._split_tail_re = re.compile(">" + _trie_pattern(
+            word[i:] for word in text_triggers for i in range(1, len(word))), re.IGNORECASE)
+        cls._compiled = True
 
     def analyze_page(self, html_content: str, url: str) -> dict:
         """
         Main entry point for analyzing a page.
-        Returns a risk report.
+        Returns a risk report, reusing the cached one when the same HTML was already seen at this URL.
         """
+        key = (hash(html_content), url)
+        with self._cache_lock:
+            report = self._report_cache.get(key)
+            if report is not None:
+                self._report_cache.move_to_end(key)
+
+        if report is None:
+            report = self._analyze_page_uncached(html_content, url)
+            with self._cache_lock:
+                self._report_cache[key] = report
+                if len(self._report_cache) > _REPORT_CACHE_SIZE:
+                    self._report_cache.popitem(last=False)
+
+        # Callers adjust reports in place (e.g. on intent mismatch), so never hand out the cached one
+        return {**report, "threats": dict(report["threats"])}
+
+    def cache_clear(self):
+        """Drops all cached risk reports, e.g. after _compile_patterns(force=True) or to release memory."""
+        with self._cache_lock:
+            self._report_cache.clear()
+
+    def _analyze_page_uncached(self, html_content: str, url: str) -> dict:
         print(f"[*] Analyzing content from: {url}")
-        soup = BeautifulSoup(html_content, 'lxml')
         
         # Check if domain is trusted
-        is_trusted = any(domain in url for domain in config.TRUSTED_DOMAINS)
+        is_trusted = bool(self._trusted_domain_re.search(url))
         if is_trusted:
             print(f"  [i] Domain {url} is in TRUSTED_DOMAINS. Applying relaxed security metrics.")
 
-        # 1. Hidden Content Detection (Context-Aware)
-        hidden_elements = self._detect_hidden_elements(soup, is_trusted)
-        
-        # 2. Prompt Injection Detection
-        injection_found = self._detect_prompt_injection(soup)
-        
-        # 3. Deceptive UI Detection
-        deceptive_ui = self._detect_deceptive_ui(soup)
-            
-        # 4. Phishing Detection (Brand mismatch)
-        phishing_risk = self._detect_phishing(soup, url)
-            
-        # 5. Fake Dialog Detection
-        fake_dialog = self._detect_fake_dialog(soup)
-            
-        # 6. Button Target Analysis
-        suspicious_targets = self._analyze_button_targets(soup, is_trusted)
+        # Pages without a single trigger in their markup (the common, benign case) cannot
+        # set off any page-content detector, so they are not even parsed
+        if config.HTML_PARSER not in _PREFILTER_PARSERS or self._has_triggers(html_content):
+            hidden_elements, injection_found, deceptive_ui, phishing_risk, fake_dialog, suspicious_targets = (
+                self._detect_page_content(html_content, url, is_trusted))
+        else:
+            hidden_elements, injection_found, deceptive_ui, suspicious_targets = [], [], [], []
+            phishing_risk = fake_dialog = None
         
         # 7. Homograph Phishing Detection (Lookalike domains)
         homograph_match = self._detect_homograph_phishing(url)
@@ -64,7 +225,7 @@ class SecurityEngine:
             phishing_risk,
             fake_dialog,
             suspicious_targets,
-            url,
+            is_trusted,
             homograph_match
         )
         
@@ -83,58 +244,94 @@ class SecurityEngine:
             }
         }
 
-    def _detect_phishing(self, soup: BeautifulSoup, url: str) -> str | None:
+    def _has_triggers(self, html_content: str) -> bool:
+        """
+        Cheap check on the raw markup: False only when no page-content detector can fire on
+        it. Character references that could spell a trigger always count as one.
+        """
+        html_lower = html_content.lower()
+        if any(trigger in html_lower for trigger in self._triggers): return True
+        # The injection detector's IGNORECASE also matches these to i and s, lower() doesn't
+        if any(char in html_content for char in _CASEFOLD_EXTRAS): return True
+        return bool(self._split_tail_re.search(html_content) and self._split_head_re.search(html_content[::-1]))
+
+    def _detect_page_content(self, html_content: str, url: str, is_trusted: bool) -> tuple:
+        """
+        Parses the page and runs every detector that looks at its content.
+        Returns (hidden, injection, deceptive, phishing, fake_dialog, suspicious_targets).
+        """
+        soup = BeautifulSoup(html_content, config.HTML_PARSER)
+        # One parse and one walk; every detector works from these buckets. Style checks
+        # the raw markup rules out are skipped in the walk and in the detectors.
+        may_hide, may_overlay, may_fade = _style_hints(html_content)
+        dom = self._scan_dom(soup, may_hide, may_overlay)
+
+        # The detectors below only read the soup and the buckets, so whole pages can be
+        # analyzed from several threads at once (the agent does). They run serially here:
+        # they are pure-Python loops, so a thread pool per page would only add overhead.
+
+        # 1. Hidden Content Detection (Context-Aware)
+        hidden_elements = self._detect_hidden_elements(dom["styled"], is_trusted) if may_hide else []
+        
+        # 2. Prompt Injection Detection
+        injection_found = self._detect_prompt_injection(dom["all_text"])
+        
+        # 3. Deceptive UI Detection
+        deceptive_ui = self._detect_deceptive_ui(dom["controls"]) if may_fade else []
+            
+        # 4. Phishing Detection (Brand mismatch)
+        phishing_risk = self._detect_phishing(" ".join(dom["visible_text"]), url)
+            
+        # 5. Fake Dialog Detection
+        fake_dialog = self._detect_fake_dialog(dom["overlay_divs"])
+            
+        # 6. Button Target Analysis
+        suspicious_targets = self._analyze_button_targets(dom["controls"], is_trusted)
+
+        return hidden_elements, injection_found, deceptive_ui, phishing_risk, fake_dialog, suspicious_targets
+
+    def _detect_phishing(self, visible_text: str, url: str) -> str | None:
         """
         Detects phishing by looking for brand keywords on non-official domains.
         Returns the brand keyword found, or None.
         """
+        # Only runs on pages _has_triggers lets through; brand keywords are triggers there
         # Phishing detection handles localhost testing
         is_local = "127.0.0.1" in url or "localhost" in url
-        visible_text = self.sanitize_for_llm(str(soup)).lower()
+        visible_text = visible_text.lower()
         
-        for brand in config.BRAND_KEYWORDS:
+        # Plain substring scans on purpose: each one is a C-level search, and for lists this
+        # size they beat a single pass with an re alternation (which tries every pattern at
+        # every offset). Revisit with a real automaton if BRAND_KEYWORDS grows into the hundreds.
+        for brand in self._brand_keywords:
             if brand in visible_text:
-                # If local and brand keyword found, it's a simulated phishing attack
-                if is_local: return brand
-                # In prod, check domain trust
-                if not any(brand in url for domain in config.TRUSTED_DOMAINS):
+                # If local and brand keyword found, it's a simulated phishing attack.
+                # In prod, a brand the URL itself carries counts as the brand's own domain
+                # (the old any() over TRUSTED_DOMAINS only ever repeated this one test).
+                if is_local or brand not in url:
                     return brand
         return None
 
     def _detect_homograph_phishing(self, url: str) -> str | None:
         """Detects lookalike domains based on edit distance."""
-        from urllib.parse import urlparse
         domain = urlparse(url).netloc.lower()
         if not domain: return None
         
         # Strip common TLDs for better matching
         base_domain = domain.split('.')[0]
+        # Labels this short are never flagged, whatever their distance
+        if len(base_domain) < 5: return None
         
-        for trusted in config.TRUSTED_DOMAINS:
-            target = trusted.split('.')[0]
+        for trusted, target in self._trusted_labels:
             if base_domain == target: continue
-            
-            # Simple Levenshtein distance implementation
-            def lev(s1, s2):
-                if len(s1) < len(s2): return lev(s2, s1)
-                if not s2: return len(s1)
-                previous_row = range(len(s2) + 1)
-                for i, c1 in enumerate(s1):
-                    current_row = [i + 1]
-                    for j, c2 in enumerate(s2):
-                        insertions = previous_row[j + 1] + 1
-                        deletions = current_row[j] + 1
-                        substitutions = previous_row[j] + (c1 != c2)
-                        current_row.append(min(insertions, deletions, substitutions))
-                    previous_row = current_row
-                return previous_row[-1]
-
-            distance = lev(base_domain, target)
+            # Edit distance is at least the length difference; skip pairs that can't be within 2
+            if abs(len(base_domain) - len(target)) > 2: continue
+
+            distance = _levenshtein(base_domain, target, max_distance=2)
             # Distance of 1 or 2 is common for homographs (e.g., google vs g00gle)
-            if distance <= 2 and len(base_domain) >= 5:
+            if distance <= 2:
                 # Check for common substitutions (o -> 0, l -> 1, m -> rn)
-                lookalikes = [('0', 'o'), ('1', 'l'), ('rn', 'm'), ('vv', 'w')]
-                for bad, good in lookalikes:
+                for bad, good in _LOOKALIKE_SUBSTITUTIONS:
                     if bad in base_domain and good in target:
                         return f"Lookalike domain detected ({domain} vs {trusted})"
                 
@@ -143,35 +340,37 @@ class SecurityEngine:
                     return f"Suspiciously similar domain ({domain} vs {trusted})"
         return None
 
-    def _detect_fake_dialog(self, soup: BeautifulSoup) -> str | None:
+    def _detect_fake_dialog(self, overlay_divs: list) -> str | None:
         """
         Detects overlays that mimic system or security alerts.
         Returns description of what was found.
         """
-        for div in soup.find_all('div'):
-            style = div.get('style', '').lower()
-            if ('position' in style and ('fixed' in style or 'absolute' in style)) and 'z-index' in style:
-                text = div.get_text().lower()
-                for kw in config.DIALOG_KEYWORDS:
-                    if kw in text:
-                        return f"Overlay detected with system keyword: '{kw}'"
+        # Only runs on pages _has_triggers lets through; overlays get in via 'z-index'
+        for div in overlay_divs:
+            text = div.get_text().lower()
+            for kw in self._dialog_keywords:
+                if kw in text:
+                    return f"Overlay detected with system keyword: '{kw}'"
         return None
 
-    def _detect_hidden_elements(self, soup: BeautifulSoup, is_trusted: bool) -> list:
+    def _detect_hidden_elements(self, styled: list, is_trusted: bool) -> list:
         """
         Returns list of metadata for elements hidden from humans but visible to LLMs.
         """
+        # Only runs on pages _has_triggers lets through; _HIDDEN_STYLES are triggers there
         hidden = []
-        for tag in soup.find_all(style=True):
-            style = tag['style'].lower()
+        for tag, style in styled:
             reason = ""
             if 'display:none' in style: reason = "display:none"
             elif 'visibility:hidden' in style: reason = "visibility:hidden"
             elif 'font-size:0' in style: reason = "font-size:0"
             
             if reason:
-                content = tag.get_text().strip().lower()
-                has_keywords = any(kw in content for kw in config.INJECTION_KEYWORDS)
+                # A lone readable string is the tag's whole text; skip the get_text() walk for it
+                content = tag.string
+                if type(content) not in _CONTENT_STRING_TYPES: content = tag.get_text()
+                content = content.strip().lower()
+                has_keywords = any(kw in content for kw in self._injection_keywords)
                 is_long_blob = len(content) > 150
                 
                 if has_keywords or (not is_trusted and is_long_blob):
@@ -182,41 +381,33 @@ class SecurityEngine:
                     })
         return hidden
 
-    def _detect_prompt_injection(self, soup: BeautifulSoup) -> list:
+    def _detect_prompt_injection(self, text_nodes: list) -> list:
         """
-        Scans for known prompt injection strings in the visible text.
-        Excludes script and style tags to avoid false positives from code.
+        Scans for known prompt injection strings in the page text, hidden text included.
+        text_nodes excludes script and style tags to avoid false positives from code, and
+        arrives already whitespace-normalized, so one join yields the normalized page text.
         """
-        injections = []
-        # Create a copy so we don't mutate the original soup used for other checks
-        clean_soup = BeautifulSoup(str(soup), 'lxml')
-        for script_or_style in clean_soup(["script", "style"]):
-            script_or_style.decompose()
-            
-        # Get all text nodes from clean content
-        text_nodes = clean_soup.find_all(string=True)
-        full_text = " ".join(text_nodes)
-        normalized_text = " ".join(full_text.split())
-        
-        for keyword in config.INJECTION_KEYWORDS:
-            if re.search(re.escape(keyword), normalized_text, re.IGNORECASE):
-                injections.append(keyword)
-            
-        return injections
+        # Only runs on pages _has_triggers lets through; keep its keyword, split and
+        # case-folding checks in step with what injection_pattern can match
+        normalized_text = " ".join(text_nodes)
+
+        # One pass over the text for all keywords; reported in config order
+        found = {match.lastindex for match in self.injection_pattern.finditer(normalized_text)}
+        return [keyword for group, keyword in enumerate(self._injection_keywords, 1) if group in found]
 
-    def _detect_deceptive_ui(self, soup: BeautifulSoup) -> list:
+    def _detect_deceptive_ui(self, controls: list) -> list:
         """
         Detects common patterns of deceptive UI (fake buttons, low opacity overlays).
         Returns list of findings.
         """
+        # Only runs on pages _has_triggers lets through; these styles get in via 'opacity'
         findings = []
-        for tag in soup.find_all(['button', 'a', 'input']):
-            style = tag.get('style', '').lower()
+        for tag, style in controls:
             if 'opacity: 0' in style or 'opacity:0' in style:
                 findings.append(f"Invisible element ({tag.name}) with zero opacity")
                 continue
             
-            opacity_match = re.search(r'opacity:\s*([0-9.]+)', style)
+            opacity_match = self.opacity_re.search(style)
             if opacity_match:
                 try:
                     val = float(opacity_match.group(1))
@@ -226,32 +417,33 @@ class SecurityEngine:
                     continue
         return findings
 
-    def _analyze_button_targets(self, soup: BeautifulSoup, is_trusted: bool) -> list:
+    def _analyze_button_targets(self, controls: list, is_trusted: bool) -> list:
         """
         Inspects click targets (hrefs, onclicks) for potential malicious redirects.
         Returns detailed list of suspicious targets.
         """
+        # Only runs on pages _has_triggers lets through; _ATTACKER_TARGET_MARKERS are triggers there
         suspicious = []
         
-        for tag in soup.find_all(['a', 'button', 'input']):
+        for tag, _ in controls:
             target = ""
             if tag.name == 'a':
                 target = tag.get('href', '')
             elif tag.name == 'button' or (tag.name == 'input' and tag.get('type') in ['button', 'submit']):
                 # Try to extract from onclick
                 onclick = tag.get('onclick', '')
-                match = re.search(r"window\.location\s*=\s*['\"]([^'\"]+)['\"]", onclick)
+                match = self.onclick_re.search(onclick)
                 if match:
                     target = match.group(1)
 
             if target and target.startswith('http'):
                 # Check if target domain is trusted
-                target_trusted = any(domain in target for domain in config.TRUSTED_DOMAINS)
+                target_trusted = bool(self._trusted_domain_re.search(target))
                 
                 # If we are on an untrusted page and it's pointing to another untrusted page, increase suspicion
                 if not is_trusted and not target_trusted:
                     # Further check: is it pointing to our localhost attacker simulation?
-                    if "127.0.0.1" in target or "attacker.com" in target:
+                    if any(marker in target for marker in _ATTACKER_TARGET_MARKERS):
                         suspicious.append({
                             "element": tag.name,
                             "text": (tag.get_text() or tag.get('value') or "").strip(),
@@ -260,45 +452,42 @@ class SecurityEngine:
                         
         return suspicious
 
-    def _calculate_risk_score(self, hidden, injection, deceptive, phishing_brand, fake_dialog, suspicious_targets, url, homograph_match=None) -> tuple[int, str]:
+    def _calculate_risk_score(self, hidden, injection, deceptive, phishing_brand, fake_dialog, suspicious_targets, is_trusted, homograph_match=None) -> tuple[int, str]:
         score = 0
         reasons = []
-        is_trusted = any(domain in url for domain in config.TRUSTED_DOMAINS)
+        weights = _WEIGHTS_BY_TRUST[is_trusted]
         
         if injection:
-            injection_weight = 2 if is_trusted else 5
-            score += injection_weight
+            score += weights["injection"]
             reasons.append(f"Prompt injection detected using keywords: {', '.join(injection)}")
         
         if hidden:
-            hidden_weight = 1 if is_trusted else 3
-            score += hidden_weight
-            descriptions = [f"{h['tag']} ({h['reason']})" for h in hidden]
-            reasons.append(f"Detected hidden content designed for AI eyes: {', '.join(descriptions)}")
+            score += weights["hidden"]
+            descriptions = ", ".join(f"{h['tag']} ({h['reason']})" for h in hidden)
+            reasons.append(f"Detected hidden content designed for AI eyes: {descriptions}")
             
         if deceptive:
-            deceptive_weight = 2 if is_trusted else 4
-            score += deceptive_weight
+            score += weights["deceptive"]
             reasons.append(f"Visual deception: {', '.join(deceptive)}")
 
         if homograph_match:
-            score += 8
+            score += weights["homograph"]
             reasons.append(f"CRITICAL: {homograph_match}")
 
         if phishing_brand:
-            score += 7
+            score += weights["phishing"]
             reasons.append(f"Phishing detected: Using brand keyword '{phishing_brand}' on an untrusted or suspicious infrastructure.")
 
         if fake_dialog:
-            score += 5
+            score += weights["fake_dialog"]
             reasons.append(f"Fake UI: {fake_dialog}")
             
         if suspicious_targets:
-            score += 4
-            target_list = [f"{t['element']} -> {t['target']}" for t in suspicious_targets]
-            reasons.append(f"Suspicious redirects found in buttons: {', '.join(target_list)}")
+            score += weights["suspicious_targets"]
+            target_list = ", ".join(f"{t['element']} -> {t['target']}" for t in suspicious_targets)
+            reasons.append(f"Suspicious redirects found in buttons: {target_list}")
             
-        if score > 10: score = 10
+        if score > _MAX_RISK_SCORE: score = _MAX_RISK_SCORE
         
         explanation = " | ".join(reasons) if reasons else "No immediate threats."
         return score, explanation
@@ -315,14 +504,13 @@ class SecurityEngine:
         
         if action_type == "navigate":
             url = action_data.get("url", "").lower()
-            malicious_patterns = ["attacker.com", "leak", "payload"]
-            is_explicit = any(pattern in task_lower for pattern in malicious_patterns)
+            is_explicit = bool(self._malicious_url_re.search(task_lower))
             
-            if any(pattern in url for pattern in malicious_patterns) and not is_explicit:
+            if self._malicious_url_re.search(url) and not is_explicit:
                 return False, f"Target URL '{url}' matches known malicious patterns and was not explicitly requested."
             
             # Contextual mismatch (e.g. news task going to something weird)
-            if "news" in task_lower and not any(trusted in url for trusted in config.TRUSTED_DOMAINS):
+            if "news" in task_lower and not self._trusted_domain_re.search(url):
                 # We don't block all non-trusted news, but this is a signal
                 pass 
         
@@ -336,25 +524,86 @@ class SecurityEngine:
 
         return True, "Action appears aligned with user intent."
 
-    def _get_visible_soup(self, soup: BeautifulSoup) -> BeautifulSoup:
+    def _walk(self, soup: BeautifulSoup, may_hide: bool = True):
         """
-        Returns a copy of the soup with all hidden elements removed.
+        Yields (node, style, hidden) for every tag and string in document order, without
+        copying or mutating the soup. style is a tag's lowercased inline style ("" for
+        strings); hidden is True inside any element hidden via inline style, which is
+        never the case when may_hide is False.
+        <script>/<style> tags are yielded but not descended into, so code never shows up as text.
         """
-        visible_soup = BeautifulSoup(str(soup), 'lxml')
-        for element in visible_soup.find_all(True):
-            style = element.get('style', '').lower()
-            if 'display:none' in style or 'visibility:hidden' in style or 'font-size:0' in style:
-                element.decompose()
-        return visible_soup
-
-    def sanitize_for_llm(self, html_content: str) -> str:
+        # Pages tend to repeat the same inline style across many tags; lowercase each
+        # distinct one once and hand out that same string for every repeat
+        lowered_styles = {}
+        stack = [(iter(soup.contents), False)]
+        while stack:
+            children, hidden = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+            elif isinstance(child, Tag):
+                style = child.get('style')
+                if style:
+                    lowered = lowered_styles.get(style)
+                    if lowered is None: lowered = lowered_styles[style] = style.lower()
+                    style = lowered
+                else:
+                    style = ""
+                yield child, style, hidden
+                if child.name not in ('script', 'style'):
+                    stack.append((iter(child.contents), hidden or (may_hide and any(marker in style for marker in _HIDDEN_STYLES))))
+            else:
+                yield child, "", hidden
+
+    def _scan_dom(self, soup: BeautifulSoup, may_hide: bool = True, may_overlay: bool = True) -> dict:
+        """
+        Sorts the page into what each detector consumes, in a single walk instead of one
+        find_all() traversal per detector:
+          styled       - (tag, style) for every tag with a style attribute
+          controls     - (tag, style) for every link, button and input
+          overlay_divs - divs positioned like a modal overlay
+          all_text     - every string outside script/style, hidden ones included, with
+                         whitespace runs collapsed and empty strings dropped
+          visible_text - stripped readable strings a human would actually see
+        may_hide/may_overlay come from _style_hints and skip style checks that cannot match.
+        """
+        dom = {"styled": [], "controls": [], "overlay_divs": [], "all_text": [], "visible_text": []}
+        for node, style, hidden in self._walk(soup, may_hide):
+            if isinstance(node, Tag):
+                if 'style' in node.attrs:
+                    dom["styled"].append((node, style))
+                if node.name in ('a', 'button', 'input'):
+                    dom["controls"].append((node, style))
+                elif may_overlay and node.name == 'div' and 'position' in style and ('fixed' in style or 'absolute' in style) and 'z-index' in style:
+                    dom["overlay_divs"].append(node)
+                continue
+
+            text = " ".join(node.split())
+            if text: dom["all_text"].append(text)
+            if not hidden and type(node) in _CONTENT_STRING_TYPES:
+                text = node.strip()
+                if text: dom["visible_text"].append(text)
+        return dom
+
+    def sanitize_for_llm(self, html_content: str, max_chars: int | None = None) -> str:
         """
         Strips dangerous tags and HIDDEN elements, then returns clean text for the LLM.
+        With max_chars, text extraction stops as soon as that much text has been collected.
         """
-        soup = BeautifulSoup(html_content, 'lxml')
-        visible_soup = self._get_visible_soup(soup)
-        
-        for script_or_style in visible_soup(["script", "style"]):
-            script_or_style.decompose()
-            
-        return visible_soup.get_text(separator=' ', strip=True)
+        soup = BeautifulSoup(html_content, config.HTML_PARSER)
+        may_hide, _, _ = _style_hints(html_content)
+
+        parts = []
+        length = 0
+        for node, _, hidden in self._walk(soup, may_hide):
+            if hidden or type(node) not in _CONTENT_STRING_TYPES: continue
+            text = node.strip()
+            if not text: continue
+            parts.append(text)
+            # Counts the separator after this part too: once the text alone reaches
+            # max_chars, the slice below is settled by what has been collected
+            length += len(text) + 1
+            if max_chars is not None and length > max_chars:
+                break
+        clean_text = " ".join(parts)
+        return clean_text if max_chars is None else clean_text[:max_chars]
@@ -1,20 +1,38 @@
+import contextlib
+import io
 import time
-import asyncio
+import timeit
 from src.security_engine import SecurityEngine
 
-async def benchmark():
+NUMBER = 10  # analyze_page calls per timing run
+REPEAT = 5   # timing runs; the fastest is the least disturbed by the rest of the system
+
+def benchmark():
     engine = SecurityEngine()
-    
+    url = "http://example.com"
+
     # Sample complex HTML
     html = "<html><body>" + "<div>Test Content</div>" * 1000 + "</body></html>"
-    
-    start = time.perf_counter()
-    report = engine.analyze_page(html, "http://example.com")
-    end = time.perf_counter()
-    
+
+    def analyze():
+        # Clear the report cache so every call does the full analysis
+        engine.cache_clear()
+        return engine.analyze_page(html, url)
+
+    # The engine logs every analysis; keep that out of the output and the timings
+    with contextlib.redirect_stdout(io.StringIO()):
+        # First call on its own: includes lxml and regex first-use costs
+        start = time.perf_counter_ns()
+        report = analyze()
+        cold_ns = time.perf_counter_ns() - start
+
+        times = timeit.repeat(analyze, timer=time.perf_counter_ns, number=NUMBER, repeat=REPEAT)
+
+    best_ms = min(times) / NUMBER / 1e6
     print(f"Performance Results:")
-    print(f"Time taken: {(end - start) * 1000:.2f}ms")
+    print(f"Cold call: {cold_ns / 1e6:.2f}ms")
+    print(f"Time taken: {best_ms:.2f}ms (best of {REPEAT} runs x {NUMBER} calls)")
     print(f"Risk Score: {report['risk_score']}")
 
 if __name__ == "__main__":
-    asyncio.run(benchmark())
+    benchmark()
@@ -0,0 +1,35 @@
+import pytest
+from src.config import config
+from src.security_engine import SecurityEngine
+
+URL = "http://evil.com"
+
+# Pages whose trigger the raw markup only shows in disguise. Each must still be parsed and
+# reported, as (page, threat, expected value in the report's threats).
+PINNED = [
+    # Split by a stray end tag the tree builder drops, gluing the text back together
+    ("<p>goo</div>gle</p>", "phishing", True),
+    ("<p>new instru</x>ctions</p>", "injection_detected", True),
+    # Case-folded: re.IGNORECASE matches these to s and i, str.lower() does not
+    ("<p>ſystem prompt</p>", "injection_detected", True),
+    ("<p>ignore previous instructıons</p>", "injection_detected", True),
+    # Spelled with character references
+    ("<p>&#115;ystem prompt</p>", "injection_detected", True),
+    ("<div style='display&colon;none'>" + "lorem ipsum " * 15 + "</div>", "hidden_content", 1),
+    ("<button style='opacity&colon;0.1'>ok</button>", "deceptive_ui", True),
+]
+
+@pytest.mark.parametrize("html, threat, expected", PINNED)
+def test_disguised_trigger_is_reported(html, threat, expected, monkeypatch):
+    # The split-tag pages only merge under lxml; html.parser keeps the two halves apart
+    monkeypatch.setattr(config, "HTML_PARSER", "lxml")
+    report = SecurityEngine().analyze_page(html, URL)
+    assert report["threats"][threat] == expected
+
+def test_nul_split_injection_with_html5lib(monkeypatch):
+    # html5lib drops NUL characters from text, so this reads "system prompt" once parsed
+    # though the raw markup holds no trigger; such builders must skip the prefilter
+    pytest.importorskip("html5lib")
+    monkeypatch.setattr(config, "HTML_PARSER", "html5lib")
+    report = SecurityEngine().analyze_page("<p>sys\x00tem prompt</p>", URL)
+    assert report["threats"]["injection_detected"]
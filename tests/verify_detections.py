@@ -4,23 +4,35 @@ from src.security_engine import SecurityEngine
 
 async def verify_detection():
     engine = SecurityEngine()
-    
+
     pages = [
         ("http://127.0.0.1:5000/benign", "Benign"),
         ("http://127.0.0.1:5000/hidden_injection", "Hidden Injection"),
         ("http://127.0.0.1:5000/fake_button", "Deceptive UI")
     ]
-    
+
     async with httpx.AsyncClient() as client:
-        for url, label in pages:
+        # Fetch every page concurrently, then analyze them side by side in worker threads
+        responses = await asyncio.gather(*(client.get(url) for url, _ in pages), return_exceptions=True)
+        # A page that fails to analyze is reported on its own, without losing the others
+        reports = await asyncio.gather(*(
+            asyncio.to_thread(lambda response=response, url=url: engine.analyze_page(response.text, url))
+            for (url, _), response in zip(pages, responses)
+            if not isinstance(response, Exception)
+        ), return_exceptions=True)
+        reports = iter(reports)
+
+        for (url, label), response in zip(pages, responses):
             print(f"\n[*] Testing {label} ({url})...")
-            try:
-                response = await client.get(url)
-                report = engine.analyze_page(response.text, url)
-                print(f"[RESULT] Risk Score: {report['risk_score']}/10")
-                print(f"[RESULT] Explanation: {report['explanation']}")
-            except Exception as e:
-                print(f"[ERROR] Could not connect to test server: {e}")
+            if isinstance(response, Exception):
+                print(f"[ERROR] Could not connect to test server: {response}")
+                continue
+            report = next(reports)
+            if isinstance(report, Exception):
+                print(f"[ERROR] Analysis failed: {report}")
+                continue
+            print(f"[RESULT] Risk Score: {report['risk_score']}/10")
+            print(f"[RESULT] Explanation: {report['explanation']}")
 
 if __name__ == "__main__":
     asyncio.run(verify_detection())